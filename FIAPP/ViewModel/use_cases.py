@@ -1,6 +1,7 @@
 from domain.producto import Producto
 from database.db_service import DBService
 from domain.local import Local
+from database.resilience import StaleData, is_stale
 
 
 class UseCases:
@@ -15,7 +16,8 @@ class UseCases:
 
     def listar_productos(self, local_id):
         productos = self.db.get_productos(local_id)
-        return productos or {}
+        # Una StaleData vacía es falsy: devolverla tal cual para no perder el aviso
+        return productos if is_stale(productos) else productos or {}
 
     def actualizar_producto(self, local_id, producto_id, nombre=None, precio=None, stock=None):
         data = {}
@@ -39,7 +41,7 @@ class UseCases:
 
     def listar_clientes(self, local_id):
         clientes = self.db.get_clientes(local_id)
-        return clientes or {}
+        return clientes if is_stale(clientes) else clientes or {}
 
     def registrar_deuda(self, local_id, cliente_id, monto, plazo_dias=None):
         self.db.registrar_deuda(local_id, cliente_id, monto, plazo_dias)
@@ -51,7 +53,7 @@ class UseCases:
         Estructura retornada: { timestamp: {"monto": float, "timestamp": int, "plazo_dias": int?}, ... }
         """
         # Intentar obtener el nodo de deudas directamente
-        detalles = self.db.ref.child(f"locales/{local_id}/clientes/{cliente_id}/deudas").get() or {}
+        detalles = self.db.get_historial_deudas(local_id, cliente_id)
         return detalles
   
     # --- Locales ---
@@ -75,21 +77,23 @@ class UseCases:
         return {"success": True}
     
     def _listar_locales(self):
-        locales = self.db.ref.child("locales").get() or {}
+        locales = self.db.get_all_locales()
         return locales
     
     def listar_locales_por_propietario(self, propietario_id):
         """Lista locales propiedad de un tendero."""
-        todos_locales = self.db.ref.child("locales").get() or {}
+        todos_locales = self.db.get_all_locales()
         resultado = {}
         for local_id, local_data in todos_locales.items():
             if local_data.get("propietario_id") == propietario_id:
                 resultado[local_id] = local_data
+        if is_stale(todos_locales):
+            return StaleData(resultado, todos_locales.age)
         return resultado
     
     def get_deudas_cliente(self, cliente_id):
-        """Obtiene todas las deudas de un cliente en todos los locales."""
-        todos_locales = self.db.ref.child("locales").get() or {}
+        """Obtiene todas las deudas de un cliente en todos los locales (de todos los shards)."""
+        todos_locales = self.db.get_all_locales()
         deudas = {}
         for local_id, local_data in todos_locales.items():
             clientes = local_data.get("clientes", {})
@@ -99,4 +103,6 @@ class UseCases:
                     "nombre_local": local_data.get("nombre"),
                     "deuda_total": deuda_total
                 }
+        if is_stale(todos_locales):
+            return StaleData(deudas, todos_locales.age)
         return deudas
@@ -1,15 +1,20 @@
 from database.auth_service import AuthService
+from database.rate_limiter import RateLimitExceeded
+from database.resilience import BackendUnavailable, is_stale
 
 
 class Administrador:
-    def __init__(self):
-        self.auth = AuthService()
+    def __init__(self, auth=None):
+        # Reutiliza el AuthService de la app (mismos límites y modo local)
+        self.auth = auth or AuthService()
 
     def crear_usuario(self, email, password, user_id):
         """Crea usuario sin asignar tipo. El tipo se asigna después."""
         try:
             uid = self.auth.register_user(email, password, user_id)
             return {"success": True, "user_id": uid}
+        except (RateLimitExceeded, BackendUnavailable):
+            raise
         except Exception as e:
             return {"error": str(e)}
 
@@ -21,13 +26,14 @@ class Administrador:
         except Exception as e:
             return {"error": str(e)}
 
-    def listar_usuarios(self):
-        usuarios = self.auth.list_users()
-        return usuarios or {}
+    def listar_usuarios(self, limit=50, cursor=None):
+        """Devuelve (usuarios, next_cursor); ver AuthService.list_users."""
+        usuarios, next_cursor = self.auth.list_users(limit, cursor)
+        return usuarios if is_stale(usuarios) else usuarios or {}, next_cursor
        
     def eliminar_usuario(self, uid):
         try:
-            self.auth.delete_user(uid)
+            self.auth.delete_user_by_id(uid)
             return {"success": True}
         except Exception as e:
             return {"error": str(e)}
@@ -3,6 +3,8 @@ import os
 import time
 from database.firebase_config import init_firebase
 from database.auth_service import AuthService
+from database.rate_limiter import RateLimiter, LoginThrottle, RateLimitExceeded, create_store
+from database.resilience import BackendUnavailable, is_stale
 from presentation.presentation import ViewModel
 
 
@@ -19,7 +21,26 @@ init_firebase()
 use_local_auth = os.getenv("USE_LOCAL_AUTH", "false").lower() in ("1", "true", "yes")
 print(f"[CONFIG] USE_LOCAL_AUTH={use_local_auth}")
 
-auth_service = AuthService(use_local=use_local_auth)
+# Limitación de peticiones: token bucket por IP y por email_key, y bloqueo
+# exponencial tras logins fallidos. Con RATE_LIMIT_REDIS_URL el estado se
+# comparte entre workers; si no, vive en memoria del proceso.
+rate_store = create_store()
+ip_limiter = RateLimiter(
+    rate=float(os.getenv("RATE_LIMIT_IP_PER_MIN", "20")) / 60,
+    capacity=int(os.getenv("RATE_LIMIT_IP_BURST", "10")),
+    store=rate_store,
+)
+email_limiter = RateLimiter(
+    rate=float(os.getenv("RATE_LIMIT_EMAIL_PER_MIN", "10")) / 60,
+    capacity=int(os.getenv("RATE_LIMIT_EMAIL_BURST", "5")),
+    store=rate_store,
+)
+login_throttle = LoginThrottle(
+    store=rate_store,
+    max_failures=int(os.getenv("LOGIN_MAX_FAILURES", "5")),
+)
+
+auth_service = AuthService(use_local=use_local_auth, limiter=email_limiter, throttle=login_throttle)
 view_model = ViewModel(auth_service)
 
 
@@ -53,6 +74,19 @@ def set_csp(response):
     return response
 
 
+def _rate_limited(template, exc):
+    """Respuesta 429 con Retry-After para peticiones rechazadas por el limitador."""
+    response = app.make_response((render_template(template, error=str(exc)), 429))
+    response.headers["Retry-After"] = str(exc.retry_after)
+    return response
+
+
+@app.errorhandler(BackendUnavailable)
+def backend_unavailable(e):
+    print(f"[BACKEND] {e}", flush=True)
+    return "Servicio no disponible temporalmente, intenta de nuevo en unos segundos", 503
+
+
 @app.route("/")
 def index():
     user = session.get("user")
@@ -83,6 +117,7 @@ def register():
             return render_template("register.html", error="Contraseña mínimo 6 caracteres")
         
         try:
+            ip_limiter.check(f"ip:{request.remote_addr}")
             res = view_model.crear_usuario(email, password, user_id)
             if res.get("success"):
                 session["user"] = user_id
@@ -91,6 +126,10 @@ def register():
                 return redirect(url_for("select_type"))
             else:
                 return render_template("register.html", error=res.get("error", "Error al registrar"))
+        except RateLimitExceeded as e:
+            return _rate_limited("register.html", e)
+        except BackendUnavailable:
+            return render_template("register.html", error="Servicio no disponible, intenta más tarde"), 503
         except Exception as e:
             error_msg = str(e)
             if "already exists" in error_msg or "ALREADY_EXISTS" in error_msg or "registrado" in error_msg:
@@ -114,6 +153,7 @@ def login():
             return render_template("login.html", error="Contraseña es requerida")
         
         try:
+            ip_limiter.check(f"ip:{request.remote_addr}")
             uid, tipo_usuario = auth_service.login_user(email, password)
             if uid and tipo_usuario:  # Usuario debe tener tipo asignado
                 session["user"] = uid
@@ -126,6 +166,10 @@ def login():
                 return redirect(url_for("select_type"))
             else:
                 return render_template("login.html", error="Email o contraseña incorrectos")
+        except RateLimitExceeded as e:
+            return _rate_limited("login.html", e)
+        except BackendUnavailable:
+            return render_template("login.html", error="Servicio no disponible, intenta más tarde"), 503
         except Exception as e:
             return render_template("login.html", error=f"Error: {str(e)}")
     
@@ -184,7 +228,7 @@ def tendero_locales():
         return redirect(url_for("login"))
     user_id = session.get("user")
     locales = view_model.listar_locales_por_propietario(user_id)
-    return render_template("tendero_locales.html", locales=locales)
+    return render_template("tendero_locales.html", locales=locales, stale=is_stale(locales))
 
 
 @app.route("/tendero/locales/create", methods=["GET", "POST"])
@@ -216,7 +260,8 @@ def tendero_inventario(local_id):
     if session.get("tipo_usuario") != "tendero":
         return redirect(url_for("login"))
     productos = view_model.listar_productos(local_id)
-    return render_template("tendero_inventario.html", local_id=local_id, productos=productos)
+    return render_template("tendero_inventario.html", local_id=local_id, productos=productos,
+                           stale=is_stale(productos))
 
 
 @app.route("/tendero/locales/<local_id>/clientes")
@@ -225,7 +270,8 @@ def tendero_clientes(local_id):
     if session.get("tipo_usuario") != "tendero":
         return redirect(url_for("login"))
     clientes = view_model.listar_clientes(local_id)
-    return render_template("tendero_clientes.html", local_id=local_id, clientes=clientes)
+    return render_template("tendero_clientes.html", local_id=local_id, clientes=clientes,
+                           stale=is_stale(clientes))
 
 
 @app.route("/cliente/deudas")
@@ -235,7 +281,27 @@ def cliente_deudas():
         return redirect(url_for("login"))
     cliente_id = session.get("user")
     deudas = view_model.get_deudas_cliente(cliente_id)
-    return render_template("cliente_deudas.html", deudas=deudas)
+    return render_template("cliente_deudas.html", deudas=deudas, stale=is_stale(deudas))
+
+
+# Administradores: user_id separados por comas (no hay rol admin en la BD)
+ADMIN_USER_IDS = {u.strip() for u in os.getenv("ADMIN_USER_IDS", "").split(",") if u.strip()}
+
+
+@app.route("/admin/users")
+def admin_users():
+    """Admin: listado paginado de usuarios (sin datos sensibles)."""
+    if session.get("user") not in ADMIN_USER_IDS:
+        return redirect(url_for("login"))
+    try:
+        limit = int(request.args.get("limit", 50))
+    except ValueError:
+        limit = 50
+    limit = max(1, min(limit, 200))
+    cursor = request.args.get("cursor", "").strip() or None
+    users, next_cursor = view_model.listar_usuarios(limit, cursor)
+    return render_template("admin_users.html", users=users, next_cursor=next_cursor,
+                           stale=is_stale(users))
 
 
 if __name__ == "__main__":
@@ -1,12 +1,36 @@
 from firebase_admin import db
 import hashlib
+import re
 from database import local_auth_db
+from database.resilience import BackendUnavailable, StaleData, is_stale
+from database.shard_router import ShardRouter
+
+
+# Caracteres que RTDB no admite en una clave (y "/" separaría la ruta)
+INVALID_KEY_RE = re.compile(r"[.#$\[\]/\x00-\x1f\x7f]")
+
+
+def validate_user_id(user_id):
+    """Lanza ValueError si `user_id` no sirve como clave de Realtime Database."""
+    if INVALID_KEY_RE.search(user_id) or len(user_id.encode()) > 768:
+        raise ValueError("El usuario no puede contener . # $ [ ] / ni caracteres de control")
 
 
 class AuthService:
-    def __init__(self, use_local=False):
+    # Índice user_id -> {email_key, email, tipo_usuario}: permite buscar por
+    # user_id y paginar el listado sin descargar `usuarios` (ni sus hashes)
+    INDEX_PATH = "usuarios_por_id"
+
+    def __init__(self, use_local=False, limiter=None, throttle=None):
         # use_local: si True, guarda/lee en archivo local en vez de Firebase (útil para debugging)
         self.use_local = use_local
+        # limiter (RateLimiter) y throttle (LoginThrottle) son opcionales; se
+        # consultan antes de cualquier lectura para no gastar cuota de la BD
+        self.limiter = limiter
+        self.throttle = throttle
+        # `usuarios` vive en la instancia principal; todas las llamadas pasan
+        # por su ResilientCaller (deadline, reintentos y breaker)
+        self.backend = ShardRouter().backend(0)
     
     def _hash_password(self, password):
         """Hash simple de contraseña."""
@@ -18,15 +42,18 @@ class AuthService:
         
         if not email or not password or not user_id:
             raise ValueError("Email, contraseña y usuario son requeridos")
+        validate_user_id(user_id)
         
         email_key = hashlib.md5(email.lower().encode()).hexdigest()
         print(f"[REGISTER] email_key: {email_key}")
+        if self.limiter:
+            self.limiter.check(f"email:{email_key}")
 
         # Verificar si ya existe
         if self.use_local:
             existing = local_auth_db.get_user_by_email(email)
         else:
-            existing = db.reference(f"usuarios/{email_key}").get()
+            existing = self.backend.read(db.reference(f"usuarios/{email_key}").get)
 
         if existing:
             print(f"[REGISTER] Email ya existe")
@@ -44,7 +71,20 @@ class AuthService:
         if self.use_local:
             local_auth_db.create_user(email, password, user_id, None)
         else:
-            db.reference(f"usuarios/{email_key}").set(data)
+            # Primero se reclama el user_id en el índice con una transacción:
+            # de dos registros simultáneos con el mismo user_id solo gana uno
+            self._claim_user_id(user_id, self._index_entry(email_key, email, None))
+            try:
+                self.backend.write(lambda: db.reference(f"usuarios/{email_key}").set(data))
+            except Exception:
+                # Sin usuario guardado el user_id vuelve a quedar libre. Si en
+                # realidad se guardó (timeout ambiguo), backfill_user_index
+                # recrea la entrada del índice
+                try:
+                    self.backend.write(db.reference(f"{self.INDEX_PATH}/{user_id}").delete)
+                except Exception as e:
+                    print(f"[REGISTER] No se pudo liberar {user_id}: {e}")
+                raise
 
         print(f"[REGISTER] ✓ Registro exitoso")
         return user_id
@@ -56,20 +96,28 @@ class AuthService:
         if not email or not password:
             print(f"[LOGIN] Email o password vacío")
             return None, None
-        
+
+        # Límite y bloqueo se evalúan antes de tocar la BD (lanzan RateLimitExceeded)
+        email_key = hashlib.md5(email.lower().encode()).hexdigest()
+        if self.limiter:
+            self.limiter.check(f"email:{email_key}")
+        if self.throttle:
+            self.throttle.check(email_key)
+
         try:
-            email_key = hashlib.md5(email.lower().encode()).hexdigest()
             print(f"[LOGIN] Buscando usuario: {email_key}")
 
             if self.use_local:
                 user_data = local_auth_db.get_user_by_email(email)
             else:
-                user_data = db.reference(f"usuarios/{email_key}").get()
+                # Sin copia en caché: nunca se autentica contra datos viejos
+                user_data = self.backend.read(db.reference(f"usuarios/{email_key}").get)
 
             print(f"[LOGIN] user_data: {user_data}")
             
             if not user_data:
                 print(f"[LOGIN] Usuario no encontrado")
+                self._login_failed(email_key)
                 return None, None
             
             stored_hash = user_data.get("password_hash")
@@ -77,34 +125,104 @@ class AuthService:
             
             if stored_hash != provided_hash:
                 print(f"[LOGIN] Contraseña incorrecta")
+                self._login_failed(email_key)
                 return None, None
             
             tipo_usuario = user_data.get("tipo_usuario")
             user_id = user_data.get("user_id")
+            if self.throttle:
+                self.throttle.reset(email_key)
             print(f"[LOGIN] ✓ Login exitoso, tipo: {tipo_usuario}, user_id: {user_id}")
             return user_id, tipo_usuario
+        except BackendUnavailable:
+            # Una caída no es "contraseña incorrecta": se propaga al llamador
+            print(f"[LOGIN] Backend no disponible")
+            raise
         except Exception as e:
             print(f"[LOGIN] Error: {e}")
             return None, None
 
+    def _claim_user_id(self, user_id, entry):
+        """Crea `usuarios_por_id/{user_id}` solo si no existe (ValueError si ya está tomado)."""
+        def claim(current):
+            if current is not None:
+                # Lanzar aborta la transacción sin escribir
+                raise ValueError("El usuario ya está registrado")
+            return entry
+
+        try:
+            self.backend.write(lambda: db.reference(f"{self.INDEX_PATH}/{user_id}").transaction(claim))
+        except ValueError:
+            print(f"[REGISTER] user_id ya existe")
+            raise
+
+    def _login_failed(self, email_key):
+        if self.throttle:
+            self.throttle.register_failure(email_key)
+
+    def _index_entry(self, email_key, email, tipo_usuario):
+        return {"email_key": email_key, "email": email, "tipo_usuario": tipo_usuario}
+
     def get_user_by_email(self, email):
         """Obtiene usuario por email."""
         email_key = hashlib.md5(email.lower().encode()).hexdigest()
-        return db.reference(f"usuarios/{email_key}").get()
+        return self.backend.read(db.reference(f"usuarios/{email_key}").get)
     
     def set_user_type(self, email, tipo_usuario):
         """Asigna el tipo de usuario (tendero/cliente) después del registro."""
         if tipo_usuario not in ('tendero', 'cliente'):
             raise ValueError("tipo_usuario debe ser 'tendero' o 'cliente'")
         email_key = hashlib.md5(email.lower().encode()).hexdigest()
-        db.reference(f"usuarios/{email_key}").update({"tipo_usuario": tipo_usuario})
+        user_id = self.backend.read(db.reference(f"usuarios/{email_key}/user_id").get)
+        updates = {f"usuarios/{email_key}/tipo_usuario": tipo_usuario}
+        if user_id:
+            updates[f"{self.INDEX_PATH}/{user_id}/tipo_usuario"] = tipo_usuario
+        self.backend.write(lambda: db.reference("/").update(updates))
         print(f"[AUTH] Tipo de usuario asignado: {email} -> {tipo_usuario}")
 
-    def list_users(self):
-        """Lista todos los usuarios."""
-        return db.reference("usuarios").get() or {}
+    def get_user_by_id(self, user_id):
+        """Entrada del índice para `user_id` ({email_key, email, tipo_usuario}) o None."""
+        validate_user_id(user_id)
+        return self.backend.read(db.reference(f"{self.INDEX_PATH}/{user_id}").get)
+
+    def list_users(self, limit=50, cursor=None):
+        """Página de usuarios ordenada por user_id, sin datos sensibles.
+
+        Devuelve `(usuarios, next_cursor)`: `usuarios` es {user_id: {email_key, email,
+        tipo_usuario}} (StaleData si es una copia en caché) y `next_cursor` el
+        user_id desde el que pedir la siguiente página (None si no hay más).
+        """
+        query = db.reference(self.INDEX_PATH).order_by_key()
+        if cursor:
+            # start_at incluye el cursor (último de la página anterior): se pide uno más y se descarta
+            query = query.start_at(cursor).limit_to_first(limit + 2)
+        else:
+            query = query.limit_to_first(limit + 1)
+        page = self.backend.read(query.get, cache_key=f"{self.INDEX_PATH}:{cursor}:{limit}")
+        if page is None:
+            page = {}
+        items = [(uid, data) for uid, data in page.items() if uid != cursor]
+        next_cursor = items[limit - 1][0] if len(items) > limit else None
+        users = dict(items[:limit])
+        if is_stale(page):
+            users = StaleData(users, page.age)
+        return users, next_cursor
 
     def delete_user(self, email):
-        """Elimina usuario."""
+        """Elimina usuario (y su entrada del índice por user_id)."""
         email_key = hashlib.md5(email.lower().encode()).hexdigest()
-        db.reference(f"usuarios/{email_key}").delete()
+        user_id = self.backend.read(db.reference(f"usuarios/{email_key}/user_id").get)
+        self._delete(email_key, user_id)
+
+    def delete_user_by_id(self, user_id):
+        """Elimina usuario a partir de su user_id usando el índice."""
+        entry = self.get_user_by_id(user_id)
+        if not entry:
+            raise ValueError("Usuario no encontrado")
+        self._delete(entry["email_key"], user_id)
+
+    def _delete(self, email_key, user_id):
+        updates = {f"usuarios/{email_key}": None}
+        if user_id:
+            updates[f"{self.INDEX_PATH}/{user_id}"] = None
+        self.backend.write(lambda: db.reference("/").update(updates))
@@ -0,0 +1,58 @@
+"""Construye el índice `usuarios_por_id` para usuarios registrados antes de que existiera.
+
+Uso (desde la carpeta FIAPP):
+
+    python -m database.backfill_user_index
+
+Recorre `usuarios` una sola vez, de `--batch` en `--batch` claves, y escribe
+cada lote con una actualización multi-ruta. Es idempotente.
+"""
+import argparse
+
+from firebase_admin import db
+
+from database.auth_service import AuthService, validate_user_id
+from database.firebase_config import init_firebase
+
+
+def backfill(batch=500):
+    auth = AuthService()
+    total = 0
+    cursor = None
+    while True:
+        query = db.reference("usuarios").order_by_key()
+        if cursor:
+            query = query.start_at(cursor)
+        page = query.limit_to_first(batch + 1).get() or {}
+        updates = {}
+        for email_key, data in page.items():
+            if email_key == cursor or not data or not data.get("user_id"):
+                continue
+            try:
+                validate_user_id(data["user_id"])
+            except ValueError:
+                print(f"[INDEX] ✗ user_id no válido como clave, se omite: {data['user_id']!r}")
+                continue
+            updates[f"{AuthService.INDEX_PATH}/{data['user_id']}"] = auth._index_entry(
+                email_key, data.get("email"), data.get("tipo_usuario"))
+        if updates:
+            db.reference("/").update(updates)
+            total += len(updates)
+            print(f"[INDEX] {total} usuarios indexados")
+        keys = list(page)
+        if len(keys) < batch + 1:
+            break
+        cursor = keys[-1]
+    print(f"[INDEX] ✓ Listo: {total} entradas")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rellena el índice user_id -> email_key")
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args(argv)
+    init_firebase()
+    backfill(args.batch)
+
+
+if __name__ == "__main__":
+    main()
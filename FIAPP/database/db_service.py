@@ -1,12 +1,22 @@
 from firebase_admin import db
+from database.resilience import BackendUnavailable, StaleData, is_stale
+from database.shard_router import ShardRouter
 
 
 class DBService:
     """
     CRUD general para locales, productos, clientes y deudas.
+
+    Cada local vive en la instancia RTDB que le asigna `ShardRouter`; las
+    consultas que cruzan locales se reparten entre todas las instancias.
+    Todas las llamadas pasan por el ResilientCaller del shard: las lecturas
+    pueden devolver StaleData (copia marcada `stale`) si el shard no responde,
+    y las escrituras lanzan BackendUnavailable (también mientras el local se
+    migra de shard).
     """
 
-    def __init__(self):
+    def __init__(self, router=None):
+        self.router = router or ShardRouter()
         self.ref = db.reference("/")
     @property
     def key(self):
@@ -14,31 +24,51 @@ class DBService:
     @key.setter
     def key(self, value):
         self.ref.key = value
+
+    def _local_ref(self, local_id, path=""):
+        """Referencia a `locales/{local_id}/{path}` en el shard del local."""
+        full = f"locales/{local_id}/{path}" if path else f"locales/{local_id}"
+        return self.router.ref_for(local_id).child(full)
+
+    def _read(self, local_id, path="", default=None, cache=True):
+        ref = self._local_ref(local_id, path)
+        backend = self.router.backend(self.router.shard_for(local_id))
+        value = backend.read(ref.get, cache_key=ref.path if cache else None)
+        return default if value is None else value
+
+    def _write(self, local_id, fn):
+        if self.router.is_moving(local_id):
+            # Escribir en el origen durante la copia perdería el cambio
+            raise BackendUnavailable(f"Local {local_id} en migración entre shards")
+        return self.router.backend(self.router.shard_for(local_id)).write(fn)
+
     # --- Productos ---
     def add_producto(self, local_id, producto_data, producto_id):
         # Crear referencia directamente con el ID proporcionado
-        new_ref = self.ref.child(f"locales/{local_id}/productos/{producto_id}")
-        new_ref.set(producto_data)
+        new_ref = self._local_ref(local_id, f"productos/{producto_id}")
+        self._write(local_id, lambda: new_ref.set(producto_data))
         return producto_id
 
     def get_productos(self, local_id):
-        return self.ref.child(f"locales/{local_id}/productos").get() or {}
+        return self._read(local_id, "productos", default={})
 
     def update_producto(self, local_id, producto_id, data):
-        self.ref.child(f"locales/{local_id}/productos/{producto_id}").update(data)
+        ref = self._local_ref(local_id, f"productos/{producto_id}")
+        self._write(local_id, lambda: ref.update(data))
 
     def delete_producto(self, local_id, producto_id):
-        self.ref.child(f"locales/{local_id}/productos/{producto_id}").delete()
+        self._write(local_id, self._local_ref(local_id, f"productos/{producto_id}").delete)
 
     # --- Clientes ---
     def add_cliente_a_local(self, local_id, cliente_id, cliente_data):
-        self.ref.child(f"locales/{local_id}/clientes/{cliente_id}").set(cliente_data)
+        ref = self._local_ref(local_id, f"clientes/{cliente_id}")
+        self._write(local_id, lambda: ref.set(cliente_data))
 
     def get_clientes(self, local_id):
-        return self.ref.child(f"locales/{local_id}/clientes").get() or {}
+        return self._read(local_id, "clientes", default={})
 
     def get_cliente(self, local_id, cliente_id):
-        return self.ref.child(f"locales/{local_id}/clientes/{cliente_id}").get()
+        return self._read(local_id, f"clientes/{cliente_id}")
 
     # --- Deudas ---
     def registrar_deuda(self, local_id, cliente_id, monto, plazo_dias=None):
@@ -48,14 +78,15 @@ class DBService:
         - Añade un registro individual bajo 'deudas/<timestamp>' con monto y plazo (si se proporciona).
         """
         # Actualizar suma total de deuda
-        deuda_ref = self.ref.child(f"locales/{local_id}/clientes/{cliente_id}/deuda")
-        deuda_actual = deuda_ref.get() or 0
+        deuda_ref = self._local_ref(local_id, f"clientes/{cliente_id}/deuda")
+        # Sin copia en caché: un acumulado viejo corrompería el total
+        deuda_actual = self._read(local_id, f"clientes/{cliente_id}/deuda", cache=False) or 0
         try:
             nueva_total = float(deuda_actual) + float(monto)
         except Exception:
             # Fallback si hay datos corruptos
             nueva_total = float(monto)
-        deuda_ref.set(nueva_total)
+        self._write(local_id, lambda: deuda_ref.set(nueva_total))
 
         # Agregar registro detallado de la deuda
         import time
@@ -67,18 +98,47 @@ class DBService:
             except Exception:
                 detalle["plazo_dias"] = plazo_dias
 
-        detalles_ref = self.ref.child(f"locales/{local_id}/clientes/{cliente_id}/deudas")
-        detalles_ref.child(timestamp).set(detalle)
-   
+        detalles_ref = self._local_ref(local_id, f"clientes/{cliente_id}/deudas")
+        self._write(local_id, lambda: detalles_ref.child(timestamp).set(detalle))
+
+    def get_historial_deudas(self, local_id, cliente_id):
+        return self._read(local_id, f"clientes/{cliente_id}/deudas", default={})
+
     # --- Locales ---
     def add_local(self, local_id, local_data):
-        self.ref.child(f"locales/{local_id}").set(local_data)
-    
+        index = self.router.shard_for(local_id)
+        ref = self.router.root(index).child(f"locales/{local_id}")
+        self.router.backend(index).write(lambda: ref.set(local_data))
+        self.router.assign(local_id, index)
+
     def get_local(self, local_id):
-        return self.ref.child(f"locales/{local_id}").get()
-    
+        return self._read(local_id)
+
     def update_local(self, local_id, data):
-        self.ref.child(f"locales/{local_id}").update(data)
+        ref = self._local_ref(local_id)
+        self._write(local_id, lambda: ref.update(data))
 
     def delete_local(self, local_id):
-        self.ref.child(f"locales/{local_id}").delete()
\ No newline at end of file
+        self._write(local_id, self._local_ref(local_id).delete)
+        self.router.forget(local_id)
+
+    def get_all_locales(self):
+        """Une los locales de todas las instancias en un solo diccionario.
+
+        Si algún shard no responde y no hay copia, se omite y el resultado se
+        devuelve como StaleData (parcial) en lugar de fallar toda la consulta.
+        """
+        def leer(index, root):
+            ref = root.child("locales")
+            try:
+                value = self.router.backend(index).read(ref.get, cache_key=ref.path)
+                return {} if value is None else value
+            except BackendUnavailable:
+                return StaleData({}, 0)
+
+        resultado = {}
+        stale = False
+        for locales in self.router.fan_out(leer):
+            stale = stale or is_stale(locales)
+            resultado.update(locales)
+        return StaleData(resultado, 0) if stale else resultado
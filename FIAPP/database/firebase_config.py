@@ -2,16 +2,26 @@ import os
 import firebase_admin
 from firebase_admin import credentials , db
 from dotenv import load_dotenv
+from database.shard_router import get_shard_urls
 
 load_dotenv()
 
 
 def init_firebase():
     cred_path = os.getenv("FIREBASE_CREDENTIALS_PATH")
-    db_url = os.getenv("FIREBASE_DB_URL")
+    # La primera URL es la instancia principal; el resto se referencian por URL (ver ShardRouter)
+    db_url = get_shard_urls()[0]
 
     if not firebase_admin._apps:
-        cred = credentials.Certificate(cred_path)
-        firebase_admin.initialize_app(cred, {"databaseURL": db_url})
+        if cred_path or not os.getenv("FIREBASE_DATABASE_EMULATOR_HOST"):
+            cred = credentials.Certificate(cred_path)
+        else:
+            # Con el emulador local no hace falta Service Account
+            cred = None
+        # httpTimeout corta el socket; el deadline de ResilientCaller acota la petición completa
+        firebase_admin.initialize_app(cred, {
+            "databaseURL": db_url,
+            "httpTimeout": float(os.getenv("FIREBASE_HTTP_TIMEOUT", "5")),
+        })
 
     print("✅ Firebase inicializado correctamente.\n")
@@ -0,0 +1,203 @@
+import json
+import os
+import threading
+import time
+
+
+class RateLimitExceeded(Exception):
+    """Se lanza cuando una petición supera el límite; `retry_after` en segundos."""
+
+    def __init__(self, message, retry_after=0):
+        super().__init__(message)
+        self.retry_after = max(0, int(retry_after + 0.999))
+
+
+class MemoryStore:
+    """Almacén en proceso con expiración por clave.
+
+    Guarda `key -> (expira_en, valor)` en un dict. Cuando se supera el umbral
+    (al principio `max_keys`) se purgan las claves expiradas. Nunca se desaloja
+    una clave vigente: un bloqueo de login activo no puede perderse porque
+    entren muchas IPs nuevas; la memoria queda acotada por los TTL.
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._data = {}
+        self._lock = threading.Lock()
+        self._next_compact = max_keys
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._set(key, value, ttl)
+
+    def update(self, key, fn):
+        """Lectura-modificación-escritura atómica.
+
+        `fn(valor_actual_o_None)` devuelve `(nuevo_valor, ttl, resultado)`;
+        se guarda `nuevo_valor` y se devuelve `resultado`.
+        """
+        with self._lock:
+            value, ttl, result = fn(self._get(key))
+            self._set(key, value, ttl)
+            return result
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def _get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[0] <= time.monotonic():
+            del self._data[key]
+            return None
+        return item[1]
+
+    def _set(self, key, value, ttl):
+        self._data.pop(key, None)
+        self._data[key] = (time.monotonic() + ttl, value)
+        if len(self._data) > self._next_compact:
+            self._compact()
+
+    def _compact(self):
+        now = time.monotonic()
+        for key in [k for k, (exp, _) in self._data.items() if exp <= now]:
+            del self._data[key]
+        # Si casi todo sigue vigente, el próximo barrido espera a que el dict
+        # duplique su tamaño: cada inserción cuesta O(1) amortizado
+        self._next_compact = max(self.max_keys, 2 * len(self._data))
+        if len(self._data) > self.max_keys:
+            print(f"[RATE] {len(self._data)} claves vigentes (umbral {self.max_keys})")
+
+
+class RedisStore:
+    """Almacén compartido entre workers (requiere el paquete `redis`)."""
+
+    def __init__(self, url, prefix="fiapp:rl:"):
+        import redis  # dependencia opcional
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._watch_error = redis.WatchError
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl + 0.999)))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def update(self, key, fn):
+        """Como `MemoryStore.update`, atómico entre workers con WATCH/MULTI.
+
+        Si otro worker modifica la clave entre la lectura y el EXEC, Redis
+        aborta la transacción y se reintenta con el valor nuevo.
+        """
+        full_key = self.prefix + key
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(full_key)
+                    raw = pipe.get(full_key)
+                    value, ttl, result = fn(json.loads(raw) if raw is not None else None)
+                    pipe.multi()
+                    pipe.set(full_key, json.dumps(value), ex=max(1, int(ttl + 0.999)))
+                    pipe.execute()
+                    return result
+                except self._watch_error:
+                    continue
+
+
+class RateLimiter:
+    """Token bucket: `capacity` fichas que se recargan a `rate` fichas/segundo."""
+
+    def __init__(self, rate, capacity, store=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.store = store if store is not None else MemoryStore()
+
+    def hit(self, key, cost=1):
+        """Consume `cost` fichas de `key`. Devuelve (permitido, segundos_para_reintentar)."""
+        def consume(state):
+            now = time.time()
+            if state is None:
+                tokens, last = self.capacity, now
+            else:
+                tokens, last = state
+            tokens = min(self.capacity, tokens + max(0, now - last) * self.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            # La clave expira cuando el bucket estaría lleno otra vez
+            ttl = (self.capacity - tokens) / self.rate + 1
+            retry_after = 0 if allowed else (cost - tokens) / self.rate
+            return [tokens, now], ttl, (allowed, retry_after)
+
+        # El store hace la actualización atómica (lock en memoria, WATCH/MULTI en Redis)
+        return self.store.update(f"tb:{key}", consume)
+
+    def check(self, key, cost=1):
+        """Como `hit`, pero lanza RateLimitExceeded si no hay fichas."""
+        allowed, retry_after = self.hit(key, cost)
+        if not allowed:
+            print(f"[RATE] Límite alcanzado para {key}")
+            raise RateLimitExceeded("Demasiados intentos, espera un momento", retry_after)
+
+
+class LoginThrottle:
+    """Bloqueo exponencial tras logins fallidos repetidos.
+
+    A partir de `max_failures` fallos seguidos la clave queda bloqueada
+    `base_lockout * 2**(fallos - max_failures)` segundos, hasta `max_lockout`.
+    """
+
+    def __init__(self, store=None, max_failures=5, base_lockout=30, max_lockout=3600, window=3600):
+        self.store = store if store is not None else MemoryStore()
+        self.max_failures = max_failures
+        self.base_lockout = base_lockout
+        self.max_lockout = max_lockout
+        self.window = window
+
+    def check(self, key):
+        """Lanza RateLimitExceeded si `key` está bloqueada."""
+        state = self.store.get(f"lf:{key}")
+        if state and state[1] > time.time():
+            print(f"[RATE] Login bloqueado para {key}")
+            raise RateLimitExceeded("Cuenta bloqueada temporalmente por intentos fallidos",
+                                    state[1] - time.time())
+
+    def register_failure(self, key):
+        def add_failure(state):
+            now = time.time()
+            failures = (state[0] if state else 0) + 1
+            locked_until = 0
+            if failures >= self.max_failures:
+                lockout = min(self.max_lockout,
+                              self.base_lockout * 2 ** (failures - self.max_failures))
+                locked_until = now + lockout
+            return [failures, locked_until], max(self.window, locked_until - now), None
+
+        # Atómico: fallos concurrentes del mismo email no se pisan entre sí
+        self.store.update(f"lf:{key}", add_failure)
+
+    def reset(self, key):
+        self.store.delete(f"lf:{key}")
+
+
+def create_store():
+    """Usa Redis si `RATE_LIMIT_REDIS_URL` está definida; si no, memoria del proceso."""
+    url = os.getenv("RATE_LIMIT_REDIS_URL")
+    if url:
+        try:
+            return RedisStore(url)
+        except ImportError:
+            print("[RATE] Paquete 'redis' no instalado; usando almacén en memoria")
+    return MemoryStore()
@@ -0,0 +1,209 @@
+"""Reubica locales entre instancias RTDB según la configuración actual de shards.
+
+Uso (desde la carpeta FIAPP):
+
+    python -m database.rebalance_shards            # muestra el plan (no escribe)
+    python -m database.rebalance_shards --pin      # fija en el directorio el shard actual de cada local
+    python -m database.rebalance_shards --apply    # migra los locales mal ubicados
+    python -m database.rebalance_shards --resume   # termina una migración interrumpida
+    python -m database.rebalance_shards --abort    # deshace las marcas de una migración interrumpida
+
+Requiere `SHARD_DIRECTORY=true` salvo para ver el plan. Cada local se mueve a
+`ShardRouter.hash_shard(local_id)` en lotes de `--batch` locales (10 por
+defecto); cada lote sigue este protocolo:
+
+1. Marca la entrada del directorio como `{"shard": origen, "moving_to": destino}`
+   (las lecturas siguen en el origen, las escrituras se rechazan con 503).
+2. Espera `SHARD_DIRECTORY_TTL` para que todos los workers vean la marca.
+3. Copia el local al destino y cambia la entrada del directorio al destino.
+4. Espera otra vez el TTL (los workers con la marca en caché leen aún del origen).
+5. Borra la copia del origen.
+
+Así cada local solo rechaza escrituras unos 2×TTL más la copia de su lote.
+Si el proceso se corta, las entradas con `moving_to` siguen bloqueando
+escrituras: `--resume` completa esos movimientos (y borra copias de origen
+que quedaran tras el cambio de directorio) y `--abort` devuelve cada entrada
+a su origen y borra la copia parcial del destino.
+
+Ver en BACKEND_MANUAL.md el orden de pasos para añadir una instancia.
+"""
+import argparse
+import time
+
+from database.firebase_config import init_firebase
+from database.shard_router import ShardRouter, parse_directory_entry
+
+
+BATCH_SIZE = 10
+
+
+def _directory_ref(router, local_id):
+    return router.root(0).child(f"{ShardRouter.DIRECTORY_PATH}/{local_id}")
+
+
+def read_directory(router):
+    """Directorio completo `{local_id: entrada}` ({} en modo hash puro)."""
+    if not router.use_directory:
+        return {}
+    return router.root(0).child(ShardRouter.DIRECTORY_PATH).get() or {}
+
+
+def plan_moves(router, directory=None):
+    """Lista de (local_id, shard_origen, shard_destino) para los locales mal ubicados.
+
+    Las copias en un shard distinto del que indica el directorio son restos
+    de una migración cortada (ver `find_leftovers`) y no se planifican.
+    """
+    directory = read_directory(router) if directory is None else directory
+    moves = []
+    for source in range(router.count):
+        ids = router.root(source).child("locales").get(shallow=True) or {}
+        for local_id in ids:
+            current = parse_directory_entry(directory.get(local_id))[0]
+            if current is not None and current != source:
+                continue
+            target = router.hash_shard(local_id)
+            if target != source:
+                moves.append((local_id, source, target))
+    return moves
+
+
+def find_pending(directory):
+    """(local_id, origen, destino) de las entradas que quedaron marcadas con `moving_to`."""
+    return [
+        (local_id, int(entry["shard"]), int(entry["moving_to"]))
+        for local_id, entry in directory.items()
+        if isinstance(entry, dict) and "moving_to" in entry
+    ]
+
+
+def find_leftovers(router, directory):
+    """(local_id, shard) de copias de origen que sobrevivieron al cambio de directorio."""
+    leftovers = []
+    for index in range(router.count):
+        ids = router.root(index).child("locales").get(shallow=True) or {}
+        for local_id in ids:
+            current, moving = parse_directory_entry(directory.get(local_id))
+            if current is not None and current != index and not moving:
+                leftovers.append((local_id, index))
+    return leftovers
+
+
+def pin_locales(router):
+    """Escribe en el directorio el shard donde está hoy cada local que no tenga entrada."""
+    pinned = 0
+    for index in range(router.count):
+        ids = router.root(index).child("locales").get(shallow=True) or {}
+        for local_id in ids:
+            ref = _directory_ref(router, local_id)
+            if parse_directory_entry(ref.get())[0] is None:
+                ref.set(index)
+                pinned += 1
+    return pinned
+
+
+def wait_for_caches(router):
+    delay = router.directory_ttl + 1
+    print(f"[SHARDS] Esperando {delay:.0f}s a que expiren las cachés del directorio...")
+    time.sleep(delay)
+
+
+def migrate_batch(router, batch):
+    """Mueve un lote con el protocolo completo; devuelve cuántos locales migró."""
+    for local_id, source, target in batch:
+        _directory_ref(router, local_id).set({"shard": source, "moving_to": target})
+    wait_for_caches(router)
+
+    copied = []
+    for local_id, source, target in batch:
+        data = router.root(source).child(f"locales/{local_id}").get()
+        if data is None:
+            print(f"  {local_id}: ✗ ya no existe en origen")
+            _directory_ref(router, local_id).delete()
+            continue
+        router.root(target).child(f"locales/{local_id}").set(data)
+        _directory_ref(router, local_id).set(target)
+        copied.append((local_id, source))
+        print(f"  {local_id}: ✓ copiado {source} -> {target}")
+    wait_for_caches(router)
+
+    for local_id, source in copied:
+        router.root(source).child(f"locales/{local_id}").delete()
+    return len(copied)
+
+
+def apply_moves(router, moves, batch_size=BATCH_SIZE):
+    migrated = 0
+    for start in range(0, len(moves), batch_size):
+        batch = moves[start:start + batch_size]
+        print(f"[SHARDS] Lote {start // batch_size + 1}: {len(batch)} locales")
+        migrated += migrate_batch(router, batch)
+    print(f"[SHARDS] ✓ {migrated} locales migrados")
+
+
+def resume_moves(router, batch_size=BATCH_SIZE):
+    """Completa las migraciones marcadas y borra las copias de origen sobrantes."""
+    directory = read_directory(router)
+    pending = find_pending(directory)
+    leftovers = find_leftovers(router, directory)
+    print(f"[SHARDS] {len(pending)} migraciones pendientes, {len(leftovers)} copias sobrantes")
+    if pending:
+        apply_moves(router, pending, batch_size)
+    if leftovers:
+        # El directorio ya apunta al destino; esperar por si el corte fue reciente
+        wait_for_caches(router)
+        for local_id, index in leftovers:
+            router.root(index).child(f"locales/{local_id}").delete()
+            print(f"  {local_id}: ✓ borrada copia sobrante en {index}")
+
+
+def abort_moves(router):
+    """Devuelve las entradas marcadas a su origen y borra la copia parcial del destino."""
+    pending = find_pending(read_directory(router))
+    for local_id, source, target in pending:
+        # Hasta el cambio de directorio el destino nunca es la copia buena
+        _directory_ref(router, local_id).set(source)
+        router.root(target).child(f"locales/{local_id}").delete()
+        print(f"  {local_id}: ✓ vuelve a {source}")
+    print(f"[SHARDS] {len(pending)} migraciones deshechas")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebalancea locales entre shards RTDB")
+    parser.add_argument("--pin", action="store_true", help="fija en el directorio la ubicación actual de cada local")
+    parser.add_argument("--apply", action="store_true", help="ejecuta los movimientos (por defecto solo muestra el plan)")
+    parser.add_argument("--resume", action="store_true", help="termina las migraciones que quedaron a medias")
+    parser.add_argument("--abort", action="store_true", help="deshace las migraciones que quedaron a medias")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="locales por lote al migrar")
+    args = parser.parse_args(argv)
+
+    if args.resume and args.abort:
+        parser.error("--resume y --abort son excluyentes")
+    if args.batch < 1:
+        parser.error("--batch debe ser al menos 1")
+
+    init_firebase()
+    router = ShardRouter()
+    print(f"[SHARDS] {router.count} instancias: {router.urls}")
+    if (args.pin or args.apply or args.resume or args.abort) and not router.use_directory:
+        parser.error("--pin, --apply, --resume y --abort requieren SHARD_DIRECTORY=true (ver BACKEND_MANUAL.md)")
+
+    if args.abort:
+        abort_moves(router)
+        return
+    if args.resume:
+        resume_moves(router, args.batch)
+
+    if args.pin:
+        print(f"[SHARDS] {pin_locales(router)} locales fijados en el directorio")
+
+    moves = plan_moves(router)
+    print(f"[SHARDS] {len(moves)} locales a mover")
+    for local_id, source, target in moves:
+        print(f"  {local_id}: {source} -> {target}")
+    if args.apply and moves:
+        apply_moves(router, moves, args.batch)
+
+
+if __name__ == "__main__":
+    main()
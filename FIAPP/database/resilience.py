@@ -0,0 +1,228 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from firebase_admin.exceptions import DeadlineExceededError, InternalError, UnavailableError
+
+from database.rate_limiter import MemoryStore
+
+
+# Errores que indican un backend lento o caído (no un bug del llamador). El resto
+# de FirebaseError (permiso denegado, argumento inválido, no encontrado...) no se
+# reintenta ni cuenta para el breaker: el backend respondió.
+# firebase_admin traduce los errores de conexión de requests a UnavailableError.
+TRANSIENT_ERRORS = (UnavailableError, DeadlineExceededError, InternalError, ConnectionError, TimeoutError, OSError)
+
+
+class BackendUnavailable(Exception):
+    """El backend no respondió a tiempo, falló tras reintentos o tiene el breaker abierto."""
+
+
+class StaleData(dict):
+    """Copia en caché servida mientras el backend no responde.
+
+    `stale` siempre es True; `age` son los segundos desde que se leyó.
+    """
+    stale = True
+
+    def __init__(self, data, age):
+        super().__init__(data)
+        self.age = age
+
+
+def is_stale(value):
+    return getattr(value, "stale", False)
+
+
+class CircuitBreaker:
+    """Breaker clásico: cerrado -> abierto tras `failure_threshold` fallos
+    seguidos -> semiabierto tras `reset_timeout` s (deja pasar una prueba)."""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                print(f"[BREAKER] {self.name} cerrado")
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def release_trial(self):
+        """Libera la prueba del semiabierto sin contarla (la llamada no llegó al backend)."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    print(f"[BREAKER] {self.name} abierto tras {self.failures} fallos")
+                self.opened_at = time.monotonic()
+
+
+class ResilientCaller:
+    """Envuelve llamadas a un backend con deadline, reintentos y breaker.
+
+    - `read`: reintenta con backoff exponencial con jitter dentro del deadline
+      total; si todo falla (o el breaker está abierto) sirve la última copia
+      buena de `cache_key` como StaleData, o lanza BackendUnavailable.
+    - `write`: un solo intento con deadline (las escrituras no se reintentan).
+    """
+
+    def __init__(self, name, timeout=5.0, retries=2, backoff=0.1, max_backoff=1.0,
+                 breaker=None, cache=None, stale_ttl=3600, max_in_flight=8):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker(name)
+        self.cache = cache if cache is not None else MemoryStore()
+        self.stale_ttl = stale_ttl
+        # Pool y cupo propios por backend: un shard colgado agota solo sus hilos.
+        # Con tantos hilos como cupos, toda llamada admitida empieza enseguida.
+        self.max_in_flight = max_in_flight
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight,
+                                            thread_name_prefix=f"backend-{name}")
+
+    def _call(self, fn, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"{self.name}: deadline agotado")
+        if not self._slots.acquire(blocking=False):
+            # Cupo lleno: fallar rápido sin tocar el breaker (no hay evidencia del backend)
+            raise BackendUnavailable(f"{self.name}: demasiadas llamadas en curso")
+        if not self.breaker.allow():
+            self._slots.release()
+            raise BackendUnavailable(f"{self.name}: circuito abierto")
+
+        def run():
+            try:
+                return fn()
+            finally:
+                self._slots.release()
+
+        try:
+            future = self._executor.submit(run)
+        except Exception:
+            self._slots.release()
+            raise
+        try:
+            result = future.result(timeout=remaining)
+        except FutureTimeout:
+            if future.cancel():
+                # Nunca llegó a ejecutarse: el hilo no liberará el cupo y, si
+                # era la prueba del semiabierto, hay que dejar pasar otra
+                self._slots.release()
+                self.breaker.release_trial()
+            else:
+                self.breaker.record_failure()
+            raise TimeoutError(f"{self.name}: sin respuesta en {self.timeout}s")
+        except TRANSIENT_ERRORS:
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            # El backend respondió; el error es del llamador (ruta inválida, etc.)
+            self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def read(self, fn, cache_key=None):
+        deadline = time.monotonic() + self.timeout
+        error = None
+        for attempt in range(self.retries + 1):
+            try:
+                value = self._call(fn, deadline)
+                if cache_key is not None:
+                    self.cache.set(cache_key, (time.time(), value), self.stale_ttl)
+                return value
+            except BackendUnavailable as e:
+                error = e
+                break
+            except TRANSIENT_ERRORS as e:
+                error = e
+                if attempt == self.retries:
+                    break
+                # Backoff exponencial con "full jitter", sin pasarse del deadline
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                if time.monotonic() + delay >= deadline:
+                    break
+                time.sleep(delay)
+        return self._serve_stale(cache_key, error)
+
+    def write(self, fn):
+        try:
+            return self._call(fn, time.monotonic() + self.timeout)
+        except BackendUnavailable:
+            raise
+        except TRANSIENT_ERRORS as e:
+            raise BackendUnavailable(f"{self.name}: {e}") from e
+
+    def _serve_stale(self, cache_key, error):
+        cached = self.cache.get(cache_key) if cache_key is not None else None
+        if cached is None:
+            print(f"[BACKEND] {self.name} no disponible: {error}")
+            if isinstance(error, BackendUnavailable):
+                raise error
+            raise BackendUnavailable(f"{self.name}: {error}") from error
+        read_at, value = cached
+        print(f"[BACKEND] {self.name} no disponible, sirviendo copia de hace {int(time.time() - read_at)}s")
+        if value is None:
+            return StaleData({}, time.time() - read_at)
+        if isinstance(value, dict):
+            return StaleData(value, time.time() - read_at)
+        return value
+
+
+_callers = {}
+_callers_lock = threading.Lock()
+
+
+def get_caller(name):
+    """ResilientCaller compartido por backend (un breaker por nombre/URL)."""
+    with _callers_lock:
+        if name not in _callers:
+            _callers[name] = ResilientCaller(
+                name,
+                timeout=float(os.getenv("BACKEND_TIMEOUT", "5")),
+                retries=int(os.getenv("BACKEND_RETRIES", "2")),
+                max_in_flight=int(os.getenv("BACKEND_MAX_IN_FLIGHT", "8")),
+                breaker=CircuitBreaker(
+                    name,
+                    failure_threshold=int(os.getenv("BREAKER_FAILURES", "5")),
+                    reset_timeout=float(os.getenv("BREAKER_RESET_SECONDS", "30")),
+                ),
+            )
+        return _callers[name]
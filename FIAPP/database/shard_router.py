@@ -0,0 +1,159 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from firebase_admin import db
+
+from database.resilience import BackendUnavailable, get_caller
+
+
+def get_shard_urls():
+    """URLs de las instancias RTDB configuradas.
+
+    `FIREBASE_DB_URLS` es una lista separada por comas; si no existe se usa
+    `FIREBASE_DB_URL` como única instancia. La primera URL es la principal
+    (donde viven `usuarios` y el directorio de shards).
+    """
+    raw = os.getenv("FIREBASE_DB_URLS", "")
+    urls = [u.strip() for u in raw.split(",") if u.strip()]
+    if not urls:
+        urls = [os.getenv("FIREBASE_DB_URL")]
+    return urls
+
+
+def directory_ttl():
+    return float(os.getenv("SHARD_DIRECTORY_TTL", "30"))
+
+
+def jump_hash(key, buckets):
+    """Jump consistent hash (Lamping y Veach): `key` entero de 64 bits -> [0, buckets).
+
+    Al pasar de N a N+1 buckets solo cambia de bucket ~1/(N+1) de las claves,
+    y todas van al nuevo.
+    """
+    bucket, j = -1, 0
+    while j < buckets:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def parse_directory_entry(entry):
+    """Entrada de `shard_directory` -> (shard, en_migración); (None, False) si no existe."""
+    if entry is None:
+        return None, False
+    if isinstance(entry, dict):
+        return int(entry["shard"]), "moving_to" in entry
+    return int(entry), False
+
+
+class ShardRouter:
+    """Asigna cada `local_id` a una instancia de Realtime Database.
+
+    Por defecto usa un hash consistente (jump hash sobre el MD5 del `local_id`):
+    añadir una instancia al final solo reubica ~1/(N+1) de los locales.
+    Con `use_directory=True` (o `SHARD_DIRECTORY=true`) consulta primero el nodo
+    `shard_directory/{local_id}` de la instancia principal, lo que permite mover
+    tiendas entre instancias sin cambiar su id (ver `rebalance_shards.py`).
+
+    Una entrada del directorio es el índice del shard, o
+    `{"shard": origen, "moving_to": destino}` mientras el local se migra: en ese
+    estado las lecturas van al origen y las escrituras se rechazan. Cada proceso
+    cachea las entradas como mucho `SHARD_DIRECTORY_TTL` segundos, y
+    `rebalance_shards` espera ese tiempo entre pasos para que ningún worker
+    siga usando una entrada vieja. Si la principal no responde se usa la
+    última entrada conocida aunque haya vencido.
+    """
+
+    DIRECTORY_PATH = "shard_directory"
+
+    def __init__(self, urls=None, use_directory=None):
+        self.urls = urls or get_shard_urls()
+        if use_directory is None:
+            use_directory = os.getenv("SHARD_DIRECTORY", "false").lower() in ("1", "true", "yes")
+        self.use_directory = use_directory
+        self.directory_ttl = directory_ttl()
+        self._directory_cache = {}
+        self._lock = threading.Lock()
+
+    @property
+    def count(self):
+        return len(self.urls)
+
+    def root(self, index):
+        """Referencia raíz de la instancia `index`."""
+        url = self.urls[index]
+        # Con una sola URL (o la por defecto) se usa la app tal cual se inicializó
+        if url is None or self.count == 1:
+            return db.reference("/")
+        return db.reference("/", url=url)
+
+    def hash_shard(self, local_id):
+        digest = hashlib.md5(str(local_id).encode()).digest()
+        return jump_hash(int.from_bytes(digest[:8], "big"), self.count)
+
+    def _route(self, local_id):
+        """(shard, en_migración) para `local_id`."""
+        if self.count == 1:
+            return 0, False
+        if not self.use_directory:
+            return self.hash_shard(local_id), False
+        now = time.monotonic()
+        with self._lock:
+            cached = self._directory_cache.get(local_id)
+            if cached and cached[0] > now:
+                return cached[1], cached[2]
+        ref = self.root(0).child(f"{self.DIRECTORY_PATH}/{local_id}")
+        try:
+            index, moving = parse_directory_entry(self.backend(0).read(ref.get))
+        except BackendUnavailable:
+            if cached is None:
+                raise
+            # Principal caída: seguir con la última entrada conocida (se
+            # conserva vencida para que la próxima llamada vuelva a consultar)
+            print(f"[SHARDS] Directorio no disponible, usando entrada en caché de {local_id}")
+            return cached[1], cached[2]
+        if index is None or not 0 <= index < self.count:
+            index, moving = self.hash_shard(local_id), False
+        with self._lock:
+            self._directory_cache[local_id] = (now + self.directory_ttl, index, moving)
+        return index, moving
+
+    def shard_for(self, local_id):
+        return self._route(local_id)[0]
+
+    def is_moving(self, local_id):
+        """True si `rebalance_shards` está migrando el local (no se admiten escrituras)."""
+        return self._route(local_id)[1]
+
+    def backend(self, index):
+        """ResilientCaller (deadline, reintentos, breaker) de la instancia `index`."""
+        return get_caller(f"rtdb:{self.urls[index] or 'default'}")
+
+    def ref_for(self, local_id):
+        return self.root(self.shard_for(local_id))
+
+    def assign(self, local_id, index):
+        """Registra `local_id -> index` en el directorio (no mueve datos)."""
+        if self.use_directory:
+            ref = self.root(0).child(f"{self.DIRECTORY_PATH}/{local_id}")
+            self.backend(0).write(lambda: ref.set(index))
+        with self._lock:
+            self._directory_cache[local_id] = (time.monotonic() + self.directory_ttl, index, False)
+
+    def forget(self, local_id):
+        if self.use_directory:
+            ref = self.root(0).child(f"{self.DIRECTORY_PATH}/{local_id}")
+            self.backend(0).write(ref.delete)
+        with self._lock:
+            self._directory_cache.pop(local_id, None)
+
+    def fan_out(self, fn):
+        """Ejecuta `fn(index, root_ref)` en todas las instancias en paralelo; devuelve la lista de resultados."""
+        if self.count == 1:
+            return [fn(0, self.root(0))]
+        with ThreadPoolExecutor(max_workers=self.count) as pool:
+            return list(pool.map(lambda i: fn(i, self.root(i)), range(self.count)))
@@ -0,0 +1,370 @@
+"""Generador de carga de extremo a extremo para la app Flask.
+
+Lanza usuarios virtuales con sesión propia (cookies) que se registran, inician
+sesión y navegan como tenderos o clientes, siguiendo una mezcla de tráfico y un
+perfil de rampa configurables. Al final informa por ruta: peticiones, errores,
+throughput y latencias p50/p95/p99.
+
+Preparación recomendada (base de datos local con el emulador de Firebase):
+
+    firebase emulators:start --only database          # escucha en 127.0.0.1:9000
+    export FIREBASE_DATABASE_EMULATOR_HOST=127.0.0.1:9000
+    export FIREBASE_DB_URL="http://127.0.0.1:9000/?ns=fiapp-load"
+    # Todos los usuarios virtuales salen de la misma IP: sube los límites de user-026
+    export RATE_LIMIT_IP_PER_MIN=100000 RATE_LIMIT_IP_BURST=10000
+    python -m app.main
+
+Uso (desde la carpeta FIAPP, en otra terminal con las mismas variables):
+
+    python -m loadtest.load_generator --base-url http://127.0.0.1:5000 \\
+        --mix tendero=0.3,cliente=0.7 --ramp 0:0,30:50,120:50,150:0 --db-direct
+
+`--db-direct` registra deudas escribiendo con `UseCases` en la misma base (la app
+no expone una ruta HTTP para ello); esas operaciones aparecen como `[db] ...`.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+import requests
+
+
+LOCAL_ID_RE = re.compile(r"/tendero/locales/(local_[^/\"]+)/inventario")
+
+
+def parse_mix(text):
+    """'tendero=0.3,cliente=0.7' -> {'tendero': 0.3, 'cliente': 0.7}."""
+    mix = {}
+    for part in text.split(","):
+        name, weight = part.split("=")
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - set(USER_TYPES)
+    if unknown:
+        raise ValueError(f"Tipos de usuario desconocidos: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def parse_ramp(text):
+    """'0:0,30:50,120:50,150:0' -> [(0, 0), (30, 50), ...] (segundos, usuarios)."""
+    points = sorted((float(t), int(u)) for t, u in (p.split(":") for p in text.split(",")))
+    if not points or points[0][0] != 0:
+        points.insert(0, (0.0, 0))
+    return points
+
+
+def users_at(ramp, elapsed):
+    """Usuarios activos en `elapsed` s, interpolando linealmente entre puntos de la rampa."""
+    for (t0, u0), (t1, u1) in zip(ramp, ramp[1:]):
+        if t0 <= elapsed < t1:
+            return round(u0 + (u1 - u0) * (elapsed - t0) / (t1 - t0))
+    return ramp[-1][1]
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Stats:
+    """Latencias y errores por ruta, compartidos entre hilos."""
+
+    def __init__(self):
+        self.routes = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, latency, ok):
+        with self._lock:
+            entry = self.routes.setdefault(route, {"latencies": [], "errors": 0})
+            entry["latencies"].append(latency)
+            if not ok:
+                entry["errors"] += 1
+
+    def report(self, duration):
+        rows = []
+        with self._lock:
+            for route, entry in sorted(self.routes.items()):
+                lat = sorted(entry["latencies"])
+                rows.append({
+                    "route": route,
+                    "requests": len(lat),
+                    "errors": entry["errors"],
+                    "error_rate": entry["errors"] / len(lat) if lat else 0.0,
+                    "rps": len(lat) / duration if duration else 0.0,
+                    "p50_ms": percentile(lat, 50) * 1000,
+                    "p95_ms": percentile(lat, 95) * 1000,
+                    "p99_ms": percentile(lat, 99) * 1000,
+                })
+        return rows
+
+
+class VirtualUser(threading.Thread):
+    """Usuario con su propia sesión HTTP. Subclases definen `setup` y `actions`."""
+
+    kind = None
+    # (nombre, peso): acción `do_<nombre>` elegida en cada paso según su peso
+    actions = []
+    think_time = (0.5, 2.0)
+    actions_per_session = (3, 8)
+
+    def __init__(self, index, runner):
+        super().__init__(daemon=True)
+        self.index = index
+        self.runner = runner
+        self.http = requests.Session()
+        tag = uuid.uuid4().hex[:8]
+        self.user_id = f"lt{self.kind[0]}{tag}"
+        self.email = f"{self.user_id}@loadtest.local"
+        self.password = "loadtest123"
+        # Etapas del alta ya completadas; `ready` solo cuando todo el alta salió bien
+        self.register_sent = False
+        self.registered = False
+        self.typed = False
+        self.ready = False
+
+    def request(self, method, path, route=None, expect=None, **kwargs):
+        """Hace la petición y la registra.
+
+        Un redirect a /login en una ruta protegida es error. Con `expect`, la
+        petición solo cuenta como correcta si redirige a una de esas rutas (los
+        formularios responden 200 con el mensaje de error cuando fallan).
+        Devuelve (respuesta, ok).
+        """
+        route = route or path
+        start = time.perf_counter()
+        try:
+            resp = self.http.request(method, self.runner.base_url + path, allow_redirects=False,
+                                     timeout=self.runner.timeout, **kwargs)
+            location = resp.headers.get("Location", "").rstrip("/")
+            ok = resp.status_code < 400
+            if resp.is_redirect and location.endswith("/login") and path != "/logout":
+                ok = False
+            if expect and not (resp.is_redirect and location.endswith(expect)):
+                ok = False
+        except requests.RequestException:
+            resp, ok = None, False
+        self.runner.stats.record(f"{method} {route}", time.perf_counter() - start, ok)
+        return resp, ok
+
+    def register(self):
+        """Registro + tipo de usuario. Reanudable: si falló a medias, retoma la etapa pendiente."""
+        if not self.registered:
+            # La respuesta de /register pudo perderse con el usuario ya guardado:
+            # registrar otra vez daría siempre "El email ya está registrado", así
+            # que antes de reintentar se prueba el login (aparte en el informe)
+            if self.register_sent and self.login(route="/login (reintento alta)"):
+                self.registered = True
+            else:
+                self.register_sent = True
+                _, self.registered = self.request("POST", "/register", expect=("/select-type",), data={
+                    "email": self.email, "password": self.password,
+                    "password_confirm": self.password, "user_id": self.user_id,
+                })
+                if not self.registered:
+                    return False
+        elif not self.typed and not self.login():
+            return False
+        if not self.typed:
+            _, self.typed = self.request("POST", "/select-type", expect=("/dashboard",),
+                                         data={"tipo_usuario": self.kind})
+        return self.typed
+
+    def login(self, route=None):
+        _, ok = self.request("POST", "/login", route=route, expect=("/dashboard", "/select-type"),
+                             data={"email": self.email, "password": self.password})
+        return ok
+
+    def logout(self):
+        self.request("GET", "/logout")
+
+    def setup(self):
+        """Deja al usuario listo para navegar; devuelve False si hay que reintentarlo."""
+        return self.register()
+
+    def think(self):
+        time.sleep(random.uniform(*self.think_time))
+
+    def run(self):
+        names = [name for name, _ in self.actions]
+        weights = [weight for _, weight in self.actions]
+        while not self.runner.stopped.is_set():
+            if self.index >= self.runner.target_users:
+                time.sleep(0.2)
+                continue
+            if not self.ready:
+                self.ready = self.setup()
+                if not self.ready:
+                    # Alta fallida (429, 503...): se conserva la sesión y se
+                    # reintenta solo la etapa pendiente tras una pausa
+                    self.think()
+                    continue
+            elif not self.login():
+                self.think()
+                continue
+            for _ in range(random.randint(*self.actions_per_session)):
+                if self.runner.stopped.is_set() or self.index >= self.runner.target_users:
+                    break
+                getattr(self, f"do_{random.choices(names, weights)[0]}")()
+                self.think()
+            self.logout()
+
+
+class TenderoUser(VirtualUser):
+    kind = "tendero"
+    actions = [("locales", 2), ("inventario", 4), ("clientes", 3), ("registrar_deuda", 2)]
+
+    def __init__(self, index, runner):
+        super().__init__(index, runner)
+        self.local_ids = []
+        self.known_clientes = set()
+
+    def setup(self):
+        if not super().setup():
+            return False
+        if not self.local_ids:
+            _, created = self.request("POST", "/tendero/locales/create", expect=("/tendero/locales",),
+                                      data={"nombre": f"Tienda {self.user_id}"})
+            if created:
+                self.do_locales()
+        return bool(self.local_ids)
+
+    def do_locales(self):
+        resp, ok = self.request("GET", "/tendero/locales")
+        if ok and resp.status_code == 200:
+            self.local_ids = LOCAL_ID_RE.findall(resp.text) or self.local_ids
+
+    def do_inventario(self):
+        if self.local_ids:
+            local_id = random.choice(self.local_ids)
+            self.request("GET", f"/tendero/locales/{local_id}/inventario",
+                         route="/tendero/locales/<local_id>/inventario")
+
+    def do_clientes(self):
+        if self.local_ids:
+            local_id = random.choice(self.local_ids)
+            self.request("GET", f"/tendero/locales/{local_id}/clientes",
+                         route="/tendero/locales/<local_id>/clientes")
+
+    def do_registrar_deuda(self):
+        use_cases = self.runner.use_cases
+        clientes = self.runner.cliente_ids()
+        if use_cases is None or not self.local_ids or not clientes:
+            return
+        local_id = random.choice(self.local_ids)
+        cliente_id = random.choice(clientes)
+        start = time.perf_counter()
+        try:
+            if (local_id, cliente_id) not in self.known_clientes:
+                use_cases.registrar_cliente(local_id, cliente_id, {"nombre": cliente_id, "deuda": 0})
+                self.known_clientes.add((local_id, cliente_id))
+            use_cases.registrar_deuda(local_id, cliente_id, random.randint(1, 50) * 1000,
+                                      plazo_dias=random.choice([None, 15, 30]))
+            ok = True
+        except Exception:
+            ok = False
+        self.runner.stats.record("[db] registrar_deuda", time.perf_counter() - start, ok)
+
+
+class ClienteUser(VirtualUser):
+    kind = "cliente"
+    actions = [("deudas", 1)]
+    think_time = (2.0, 5.0)
+
+    def do_deudas(self):
+        self.request("GET", "/cliente/deudas")
+
+
+USER_TYPES = {"tendero": TenderoUser, "cliente": ClienteUser}
+
+
+class LoadRunner:
+    def __init__(self, base_url, mix, ramp, timeout=10.0, use_cases=None):
+        self.base_url = base_url.rstrip("/")
+        self.mix = mix
+        self.ramp = ramp
+        self.timeout = timeout
+        self.use_cases = use_cases
+        self.stats = Stats()
+        self.stopped = threading.Event()
+        self.target_users = 0
+        self.users = []
+
+    def cliente_ids(self):
+        return [u.user_id for u in self.users if u.kind == "cliente" and u.ready]
+
+    def _build_users(self, total):
+        # Reparto determinista según la mezcla: el usuario i tiene el tipo que
+        # más se aleja de su cuota, así cualquier prefijo respeta la proporción
+        weight_sum = sum(self.mix.values())
+        counts = {kind: 0 for kind in self.mix}
+        for index in range(total):
+            kind = max(self.mix, key=lambda k: self.mix[k] / weight_sum * (index + 1) - counts[k])
+            counts[kind] += 1
+            self.users.append(USER_TYPES[kind](index, self))
+
+    def run(self):
+        duration = self.ramp[-1][0]
+        self._build_users(max(u for _, u in self.ramp))
+        for user in self.users:
+            user.start()
+        start = time.monotonic()
+        while (elapsed := time.monotonic() - start) < duration:
+            self.target_users = users_at(self.ramp, elapsed)
+            print(f"\r[LOAD] t={int(elapsed):>4}s usuarios={self.target_users:>4}", end="", flush=True)
+            time.sleep(1)
+        # El fin se toma antes de parar: los join no cuentan para req/s
+        end = time.monotonic()
+        self.stopped.set()
+        for user in self.users:
+            user.join(timeout=self.timeout)
+        print()
+        return self.stats.report(end - start)
+
+
+def print_report(rows):
+    header = f"{'ruta':<48} {'reqs':>7} {'err%':>6} {'req/s':>7} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(f"{r['route']:<48} {r['requests']:>7} {r['error_rate'] * 100:>5.1f}% {r['rps']:>7.2f} "
+              f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+    total = sum(r["requests"] for r in rows)
+    errors = sum(r["errors"] for r in rows)
+    print(f"\nTotal: {total} peticiones, {errors} errores ({(errors / total * 100) if total else 0:.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generador de carga para FIAPP")
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--mix", default="tendero=0.3,cliente=0.7",
+                        help="proporción por tipo de usuario, ej. tendero=0.3,cliente=0.7")
+    parser.add_argument("--ramp", default="0:0,30:20,90:20,100:0",
+                        help="puntos segundos:usuarios, interpolados linealmente")
+    parser.add_argument("--timeout", type=float, default=10.0, help="timeout por petición (s)")
+    parser.add_argument("--db-direct", action="store_true",
+                        help="registrar deudas con UseCases contra la misma base de datos")
+    parser.add_argument("--json", help="guarda el informe en este archivo")
+    args = parser.parse_args(argv)
+
+    use_cases = None
+    if args.db_direct:
+        from database.firebase_config import init_firebase
+        from ViewModel.use_cases import UseCases
+        init_firebase()
+        use_cases = UseCases()
+
+    runner = LoadRunner(args.base_url, parse_mix(args.mix), parse_ramp(args.ramp), args.timeout, use_cases)
+    rows = runner.run()
+    print_report(rows)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"mix": runner.mix, "ramp": runner.ramp, "routes": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
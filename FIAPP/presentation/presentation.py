@@ -7,7 +7,7 @@ class ViewModel:
     def __init__(self, auth_service):
         self.auth_service = auth_service
         self.use_cases = UseCases()
-        self.user_manager = Administrador()
+        self.user_manager = Administrador(auth_service)
         self.current_user = None
         self.db = DBService()
 
@@ -28,8 +28,8 @@ class ViewModel:
         """Asigna tipo de usuario después del registro."""
         return self.user_manager.asignar_tipo_usuario(email, tipo_usuario)
 
-    def listar_usuarios(self):
-        return self.user_manager.listar_usuarios()
+    def listar_usuarios(self, limit=50, cursor=None):
+        return self.user_manager.listar_usuarios(limit, cursor)
 
     def eliminar_usuario(self, uid):
         return self.user_manager.eliminar_usuario(uid)
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def estimate_tokens(text):
+    """Aproximación barata: ~4 caracteres por token (sin depender de tiktoken)."""
+    return len(text) // 4 + 1
+
+
+def message_tokens(message):
+    # Unos tokens extra por mensaje por el rol y los separadores del formato chat
+    return estimate_tokens(message["content"]) + 4
+
+
+def split_context(messages, budget):
+    """Separa el historial en (antiguos, recientes).
+
+    `recientes` son los últimos mensajes que caben en `budget` tokens (siempre
+    al menos el último); `antiguos` es todo lo anterior, pendiente de resumir.
+    """
+    used = 0
+    start = len(messages)
+    for i in range(len(messages) - 1, -1, -1):
+        cost = message_tokens(messages[i])
+        if used + cost > budget and start < len(messages):
+            break
+        used += cost
+        start = i
+    return messages[:start], messages[start:]
+
+
+def build_messages(summary, recent):
+    """Mensajes a enviar: el resumen (si hay) como system + los turnos recientes."""
+    result = []
+    if summary:
+        result.append({"role": "system", "content": f"Resumen de la conversación anterior: {summary}"})
+    result.extend({"role": m["role"], "content": m["content"]} for m in recent)
+    return result
+
+
+def summarize(client, model, previous_summary, messages, max_tokens=200):
+    """Incorpora `messages` al resumen previo con una llamada corta al modelo."""
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    prompt = (
+        "Actualiza el resumen de la conversación con los nuevos mensajes. "
+        "Conserva datos, nombres y decisiones importantes; sé breve.\n\n"
+        f"Resumen actual: {previous_summary or '(vacío)'}\n\nNuevos mensajes:\n{transcript}"
+    )
+    response = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=max_tokens,
+    )
+    return response.choices[0].message.content.strip()
+
+
+class LRUCache:
+    """Caché LRU de respuestas, con clave = hash de (modelo, mensajes enviados)."""
+
+    def __init__(self, max_size=128):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Compartida entre sesiones de Streamlit, que corren en hilos distintos
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model, messages):
+        raw = json.dumps([model, messages], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+
+class TurnMetrics:
+    """Mide un turno: tiempo hasta el primer token (TTFT) y tokens por segundo.
+
+    El TTFT se cuenta desde la creación (antes de resumir el contexto, si toca);
+    `summary_s` guarda aparte cuánto de ese tiempo fue el resumen.
+    """
+
+    def __init__(self, prompt_tokens=0):
+        self.prompt_tokens = prompt_tokens
+        self.start = time.perf_counter()
+        self.first_token_at = None
+        self.end = None
+        self.output_tokens = 0
+        self.summary_s = 0.0
+        self.cached = False
+
+    def track(self, stream):
+        """Envuelve el stream de OpenAI y va cediendo el texto de cada chunk."""
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+            # Los servidores compatibles con OpenAI envían ~1 token por chunk
+            self.output_tokens += 1
+            yield delta
+        self.end = time.perf_counter()
+
+    @property
+    def ttft(self):
+        return (self.first_token_at or self.end or self.start) - self.start
+
+    @property
+    def tokens_per_second(self):
+        if self.first_token_at is None or self.end is None or self.end <= self.first_token_at:
+            return 0.0
+        return self.output_tokens / (self.end - self.first_token_at)
+
+    def as_dict(self):
+        return {
+            "ttft_s": round(self.ttft, 3),
+            "tokens_per_s": round(self.tokens_per_second, 1),
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "summary_s": round(self.summary_s, 3),
+            "total_s": round((self.end or time.perf_counter()) - self.start, 3),
+            "cached": self.cached,
+        }
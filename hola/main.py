@@ -1,21 +1,52 @@
 import streamlit as st
 from openai import OpenAI
 import os
+import time
 from dotenv import load_dotenv # Importar esto
 
+from chat_context import (
+    LRUCache, TurnMetrics, build_messages, estimate_tokens, message_tokens, split_context, summarize,
+)
+
 # Cargar las variables del archivo .env
 load_dotenv()
 
+# CHAT_BASE_URL permite apuntar a un servidor local compatible con OpenAI para pruebas
+BASE_URL = os.environ.get("CHAT_BASE_URL", "https://api.groq.com/openai/v1")
+MODEL = os.environ.get("CHAT_MODEL", "llama-3.3-70b-versatile")
+# Presupuesto de tokens para los turnos recientes (el resumen va aparte)
+CONTEXT_TOKENS = int(os.environ.get("CHAT_CONTEXT_TOKENS", "3000"))
+CACHE_SIZE = int(os.environ.get("CHAT_CACHE_SIZE", "128"))
+# Los turnos que salen de la ventana se resumen por lotes: solo cuando los
+# pendientes superan este tamaño (hasta entonces se siguen enviando completos)
+SUMMARY_BATCH_TOKENS = int(os.environ.get("CHAT_SUMMARY_BATCH_TOKENS", "1000"))
+
 st.title("🤖 Mi Chatbot con IA")
 
-client = OpenAI(
-    base_url="https://api.groq.com/openai/v1",
-    # Ahora la clave se lee del sistema, no está escrita aquí
-    api_key=os.environ.get("GROQ_API_KEY") 
-)
+
+@st.cache_resource
+def get_client():
+    return OpenAI(
+        base_url=BASE_URL,
+        # Ahora la clave se lee del sistema, no está escrita aquí
+        api_key=os.environ.get("GROQ_API_KEY", "local"),
+    )
+
+
+@st.cache_resource
+def get_cache():
+    # Compartida entre sesiones: misma pregunta con mismo contexto -> misma respuesta
+    return LRUCache(CACHE_SIZE)
+
+
+client = get_client()
+cache = get_cache()
 
 if "messages" not in st.session_state:
     st.session_state.messages = []
+    st.session_state.summary = ""
+    st.session_state.summarized = 0  # nº de mensajes ya incorporados al resumen
+    st.session_state.metrics = []
 
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
@@ -28,17 +59,56 @@ if prompt := st.chat_input("¿En qué puedo ayudarte?"):
 
     with st.chat_message("assistant"):
         try:
-            stream = client.chat.completions.create(
-                # 2. CAMBIO DE MODELO (Usamos Llama 3 gratis)
-                model="llama-3.3-70b-versatile", 
-                messages=[
-                    {"role": m["role"], "content": m["content"]}
-                    for m in st.session_state.messages
-                ],
-                stream=True,
-            )
-            response = st.write_stream(stream)
+            # El reloj arranca antes del resumen: el TTFT incluye todo lo que espera el usuario
+            metrics = TurnMetrics()
+            # Ventana acotada: turnos recientes dentro del presupuesto + resumen de los anteriores
+            old, recent = split_context(st.session_state.messages, CONTEXT_TOKENS)
+            pending = old[st.session_state.summarized:]
+            if sum(message_tokens(m) for m in pending) >= SUMMARY_BATCH_TOKENS:
+                summary_start = time.perf_counter()
+                st.session_state.summary = summarize(client, MODEL, st.session_state.summary, pending)
+                st.session_state.summarized = len(old)
+                metrics.summary_s = time.perf_counter() - summary_start
+                pending = []
+            context = build_messages(st.session_state.summary, pending + recent)
+            metrics.prompt_tokens = sum(estimate_tokens(m["content"]) for m in context)
+
+            key = cache.make_key(MODEL, context)
+            response = cache.get(key)
+            if response is not None:
+                metrics.cached = True
+                metrics.end = time.perf_counter()
+                st.markdown(response)
+            else:
+                stream = client.chat.completions.create(
+                    # 2. CAMBIO DE MODELO (Usamos Llama 3 gratis)
+                    model=MODEL,
+                    messages=context,
+                    stream=True,
+                )
+                response = st.write_stream(metrics.track(stream))
+                cache.put(key, response)
             st.session_state.messages.append({"role": "assistant", "content": response})
-        
+
+            turn = metrics.as_dict()
+            st.session_state.metrics.append(turn)
+            st.caption(
+                "⚡ caché" if turn["cached"] else
+                f"TTFT {turn['ttft_s']}s · {turn['tokens_per_s']} tok/s · "
+                f"contexto ~{turn['prompt_tokens']} tok" +
+                (f" · resumen {turn['summary_s']}s" if turn["summary_s"] else "")
+            )
+
         except Exception as e:
-            st.error(f"Error: {e}")
\ No newline at end of file
+            st.error(f"Error: {e}")
+
+with st.sidebar:
+    st.subheader("📊 Métricas")
+    st.metric("Aciertos de caché", f"{cache.hits}/{cache.hits + cache.misses}")
+    streamed = [m for m in st.session_state.metrics if not m["cached"]]
+    if streamed:
+        st.metric("TTFT medio (s)", round(sum(m["ttft_s"] for m in streamed) / len(streamed), 3))
+        st.metric("Tokens/s medio", round(sum(m["tokens_per_s"] for m in streamed) / len(streamed), 1))
+    if st.session_state.summary:
+        with st.expander("Resumen del contexto"):
+            st.write(st.session_state.summary)
@@ -0,0 +1,92 @@
+"""Servidor local compatible con OpenAI (solo /v1/chat/completions) para probar el chatbot.
+
+Uso:
+
+    python stub_server.py --port 8001 --ttft 0.3 --delay 0.02
+    CHAT_BASE_URL=http://127.0.0.1:8001/v1 streamlit run main.py
+
+En streaming (SSE) responde con un eco de la última pregunta; sin streaming
+(los resúmenes) con un texto corto fijo. Corta la respuesta a `max_tokens`
+palabras y registra en consola cuántos mensajes y caracteres recibió.
+"""
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    ttft = 0.2
+    delay = 0.02
+    max_tokens = 256
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        messages = body.get("messages", [])
+        size = sum(len(m.get("content") or "") for m in messages)
+        print(f"[STUB] {len(messages)} mensajes, {size} caracteres, stream={body.get('stream', False)}", flush=True)
+
+        # Como un modelo real, nunca devuelve más de max_tokens "tokens" (palabras)
+        max_tokens = body.get("max_tokens") or self.max_tokens
+        last = messages[-1]["content"] if messages else ""
+        if body.get("stream"):
+            words = f"Respuesta de prueba a: {last}".split(" ")
+        else:
+            # Sin streaming solo llegan los resúmenes de chat_context: uno corto y
+            # fijo, para que el contexto no crezca con cada resumen
+            words = f"Resumen de prueba de {len(messages)} mensajes y {size} caracteres.".split(" ")
+        finish = "length" if len(words) > max_tokens else "stop"
+        words = words[:max_tokens]
+        base = {"id": "chatcmpl-stub", "created": int(time.time()), "model": body.get("model", "stub")}
+
+        if not body.get("stream"):
+            payload = dict(base, object="chat.completion", choices=[{
+                "index": 0, "finish_reason": finish,
+                "message": {"role": "assistant", "content": " ".join(words)},
+            }])
+            data = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        time.sleep(self.ttft)
+        for i, word in enumerate(words):
+            chunk = dict(base, object="chat.completion.chunk", choices=[{
+                "index": 0, "finish_reason": None,
+                "delta": {"content": word if i == 0 else " " + word},
+            }])
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(self.delay)
+        end = dict(base, object="chat.completion.chunk", choices=[{"index": 0, "finish_reason": finish, "delta": {}}])
+        self.wfile.write(f"data: {json.dumps(end)}\n\ndata: [DONE]\n\n".encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor OpenAI de prueba")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--ttft", type=float, default=0.2, help="segundos antes del primer token")
+    parser.add_argument("--delay", type=float, default=0.02, help="segundos entre tokens")
+    parser.add_argument("--max-tokens", type=int, default=256, help="tope de palabras si la petición no trae max_tokens")
+    args = parser.parse_args()
+    StubHandler.ttft = args.ttft
+    StubHandler.delay = args.delay
+    StubHandler.max_tokens = args.max_tokens
+    print(f"[STUB] Escuchando en http://127.0.0.1:{args.port}/v1")
+    ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()